@@ -0,0 +1,170 @@
+"""Concurrency load harness for mainV5.py.
+
+Runs N scripted analyst sessions at the same time against a synthetic
+caprae.xlsx using Streamlit's AppTest, then reports rerun latency and memory.
+AppTest is not thread-safe, so every session runs in its own process and
+measures its own peak RSS.
+
+Limitation: each process has its own Streamlit runtime and its own cold
+st.cache_data, while a deployed mainV5.py serves every analyst from one server
+process with shared caches. The numbers therefore describe N independent
+single-user servers competing for CPU, not N sessions sharing one server, and
+the per-session memory figure includes each process's own copy of the dataset.
+Only the on-disk result cache is shared between the sessions.
+
+Example:
+    python loadHarness.py --sessions 8 --isolates 300 --positions 2000
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mainV5.py")
+BASES = ['A', 'C', 'G', 'T']
+SUBSTITUTIONS = ['nonsynonymous', 'synonymous', 'intergenic']
+
+
+def makeSyntheticDataset(path, nIsolates, nPositions, nGroups, seed=0):
+    """Write a caprae.xlsx-shaped workbook: root, MQ and annotation rows, then isolates."""
+    rng = np.random.default_rng(seed)
+    coordinates = np.sort(rng.choice(np.arange(1, 4_400_000), size=nPositions, replace=False))
+    positionColumns = [f"MTBC0_{coordinate}" for coordinate in coordinates]
+    rootIdx = rng.integers(0, len(BASES), size=nPositions)
+    rootBases = np.array(BASES)[rootIdx]
+
+    rows = [['root', np.nan] + list(rootBases),
+            ['MQ', np.nan] + list(rng.integers(20, 61, size=nPositions))]
+    annotation = ['annotation', np.nan]
+    for idx, coordinate in enumerate(coordinates):
+        gene = idx // 10
+        annotation.append(f"{rootBases[idx]}{coordinate}X,gene{gene},Rv{gene:04d},{rng.choice(SUBSTITUTIONS)}")
+    rows.append(annotation)
+
+    # Each lineage shares one alt base at its own set of SNPs, on top of sporadic per-isolate noise
+    lineageSNPs = [rng.random(nPositions) < 0.05 for _ in range(nGroups)]
+    lineageAlts = [np.array(BASES)[(rootIdx + rng.integers(1, len(BASES), size=nPositions)) % len(BASES)]
+                   for _ in range(nGroups)]
+    for isolate in range(nIsolates):
+        group = isolate % nGroups
+        bases = rootBases.copy()
+        bases[lineageSNPs[group]] = lineageAlts[group][lineageSNPs[group]]
+        noise = rng.random(nPositions) < 0.01
+        bases[noise] = rng.choice(BASES, size=noise.sum())
+        bases[rng.random(nPositions) < 0.005] = 'N'
+        bases[rng.random(nPositions) < 0.002] = '-'
+        rows.append([f"isolate_{isolate}", f"Lineage_{group}"] + list(bases))
+
+    pd.DataFrame(rows, columns=['Unnamed: 0', 'Group'] + positionColumns).to_excel(path, index=False)
+    return [f"Lineage_{group}" for group in range(nGroups)], [f"isolate_{isolate}" for isolate in range(nIsolates)]
+
+
+def widgetByLabel(widgets, label):
+    """Find a widget in an AppTest element list by its label."""
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def peakRSS():
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def runSession(sessionId, groups, isolates, timeout):
+    """Script one analyst session in this worker process.
+
+    Returns the latency of every rerun in seconds and the growth of peak RSS
+    over the process's footprint before the session started.
+    """
+    rng = random.Random(sessionId)
+    startRSS = peakRSS()
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    latencies = []
+
+    def rerun():
+        start = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"Session {sessionId} raised: {at.exception[0].value}")
+
+    rerun()
+
+    # Group selection, then move the threshold slider
+    at.radio(key='selection_mode').set_value('Group Selection')
+    rerun()
+    widgetByLabel(at.sidebar.multiselect, "Choose Group(s)").set_value(rng.sample(groups, k=min(2, len(groups))))
+    rerun()
+    widgetByLabel(at.sidebar.slider, "Threshold for displaying mutations").set_value(rng.choice([0.1, 0.3, 0.7]))
+    rerun()
+
+    # Expander bodies always execute; read the group stats tables as an analyst opening it would
+    widgetByLabel(at.expander, "View SNP Type Distribution Across Groups")
+
+    # Individual selection through the form, then another threshold change
+    at.radio(key='selection_mode').set_value('Individual Selection')
+    rerun()
+    widgetByLabel(at.sidebar.multiselect, "Choose Isolate(s) (type to search)").set_value(
+        rng.sample(isolates, k=min(20, len(isolates))))
+    widgetByLabel(at.sidebar.button, "Apply Selections").click()
+    rerun()
+    widgetByLabel(at.sidebar.slider, "Threshold for displaying mutations").set_value(rng.choice([0.0, 0.5, 0.9]))
+    rerun()
+    return latencies, peakRSS() - startRSS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent scripted sessions against mainV5.py")
+    parser.add_argument("--sessions", type=int, default=4, help="number of concurrent sessions")
+    parser.add_argument("--isolates", type=int, default=200)
+    parser.add_argument("--positions", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout in seconds")
+    args = parser.parse_args()
+
+    originalDir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="caprae_load_") as workDir:
+        groups, isolates = makeSyntheticDataset(os.path.join(workDir, "caprae.xlsx"),
+                                                args.isolates, args.positions, args.groups)
+        # Workers inherit the working directory (the app reads caprae.xlsx from it) and a private result cache
+        os.chdir(workDir)
+        os.environ["CAPRAE_CACHE_DIR"] = os.path.join(workDir, "cache")
+        try:
+            # One fresh process per session, so every session starts cold like a new server worker
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=args.sessions, max_tasks_per_child=1) as pool:
+                futures = [pool.submit(runSession, sessionId, groups, isolates, args.timeout)
+                           for sessionId in range(args.sessions)]
+                results = [future.result() for future in futures]
+            wall = time.perf_counter() - start
+        finally:
+            os.chdir(originalDir)
+
+    coldLatencies = np.array([latencies[0] for latencies, _ in results])
+    latencies = np.array([latency for sessionLatencies, _ in results for latency in sessionLatencies[1:]])
+    memory = np.array([memoryGrowth for _, memoryGrowth in results]) / 2**20
+    print(f"Sessions: {args.sessions}  Reruns: {len(latencies) + len(coldLatencies)}  Wall time: {wall:.2f}s")
+    print(f"Cold first run p50: {np.percentile(coldLatencies, 50) * 1000:.0f} ms  "
+          f"max: {coldLatencies.max() * 1000:.0f} ms")
+    print(f"Rerun latency p50: {np.percentile(latencies, 50) * 1000:.0f} ms  "
+          f"p95: {np.percentile(latencies, 95) * 1000:.0f} ms  max: {latencies.max() * 1000:.0f} ms")
+    print(f"Per-session peak RSS growth: p50 {np.percentile(memory, 50):.1f} MiB  max {memory.max():.1f} MiB")
+    print("Note: each session ran in its own process with its own Streamlit runtime and caches, so these figures "
+          "describe independent single-user servers, not sessions sharing one server; memory includes each "
+          "process's own copy of the dataset.")
+
+
+if __name__ == "__main__":
+    main()
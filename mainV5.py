@@ -1,10 +1,50 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import functools
+import io
+import itertools
+import re
+import resultCache
 
 # Set the page configuration
 st.set_page_config(layout="wide")
 
+def parseCoordinate(column):
+    """Genome coordinate of a position column (its last run of digits), or None if it has none."""
+    if isinstance(column, (int, float)):
+        return int(column)
+    match = re.search(r'(\d+)\D*$', str(column))
+    return int(match.group(1)) if match else None
+
+# Fixed code set for base calls: A/C/G/T, gap, N, then IUPAC ambiguity codes
+CODE_ALPHABET = np.array(['A', 'C', 'G', 'T', '-', 'N', 'R', 'Y', 'S', 'W', 'K', 'M', 'B', 'D', 'H', 'V'])
+GAP_CODE = 4
+N_CODE = 5
+GAP_TOKENS = ['-', '.', '*']
+
+def normalizeBaseCall(value):
+    """Map a raw base call to its code; unrecognised calls (blank, nan, ...) become N."""
+    token = str(value).strip().upper()
+    if token in GAP_TOKENS:
+        return GAP_CODE
+    matches = np.flatnonzero(CODE_ALPHABET == token)
+    return matches[0] if len(matches) else N_CODE
+
+def encodeBaseCalls(df, positionColumns):
+    """Encode base calls as an int8 (rows x positions) matrix aligned with df rows.
+
+    Each distinct raw call is normalized once, then broadcast back over the
+    matrix. The MQ and annotation rows are not base calls and are left as N.
+    """
+    isBaseRow = ~df['Unnamed: 0'].isin(['MQ', 'annotation']).to_numpy()
+    tokenIdx, tokens = pd.factorize(df.loc[isBaseRow, positionColumns].to_numpy().ravel())
+    # Trailing N catches missing values, which factorize marks as -1
+    lookup = np.array([normalizeBaseCall(token) for token in tokens] + [N_CODE], dtype=np.int8)
+    codes = np.full((len(df), len(positionColumns)), N_CODE, dtype=np.int8)
+    codes[isBaseRow] = lookup[tokenIdx].reshape(-1, len(positionColumns))
+    return codes
+
 # Cache data loading
 @st.cache_data(ttl=3600)
 def loadData():
@@ -12,22 +52,123 @@ def loadData():
     # Check if 'Group' column exists, if not, create it with default group
     if 'Group' not in df.columns:
         df['Group'] = 'All Isolates'  # Default group name when no groups exist
-    return df.apply(lambda col: col.astype(str) if col.dtype == 'object' else col)
+    # Order positions by genome coordinate; columns without one go last
+    positions = [col for col in df.columns if col not in ['Unnamed: 0', 'Group']]
+    coordinates = [parseCoordinate(col) for col in positions]
+    order = sorted(range(len(positions)), key=lambda idx: (coordinates[idx] is None, coordinates[idx] or 0))
+    positions = [positions[idx] for idx in order]
+    df = df[['Unnamed: 0', 'Group'] + positions]
+    df = df.apply(lambda col: col.astype(str) if col.dtype == 'object' else col)
+    # Normalize all base calls once per load; everything downstream works on these codes
+    return df, encodeBaseCalls(df, positions)
+
+df, codes = loadData()
+
+# Dataset content hash and code version key the persistent result cache
+@st.cache_data(ttl=3600)
+def getDatasetHash():
+    return resultCache.fileDigest("caprae.xlsx")
+
+datasetHash = getDatasetHash()
+CODE_VERSION = resultCache.fileDigest(__file__)
+
+@st.cache_data(ttl=3600, max_entries=64)
+def getPersistentResult(kind, datasetHash, selection, threshold, _compute):
+    """Keep disk-cached results in memory too; _compute only runs on a miss in both caches."""
+    return resultCache.getOrCompute(kind, datasetHash, selection, threshold, CODE_VERSION, _compute)
+
+def getQCReport(codes, labels, axis):
+    """Count called, gap, N and ambiguous calls along axis (1 = per isolate, 0 = per position)."""
+    called = (codes < GAP_CODE).sum(axis=axis)
+    gaps = (codes == GAP_CODE).sum(axis=axis)
+    missing = (codes == N_CODE).sum(axis=axis)
+    ambiguous = (codes > N_CODE).sum(axis=axis)
+    total = codes.shape[axis]
+    return pd.DataFrame({
+        'Called (ACGT)': called,
+        'Gap': gaps,
+        'N': missing,
+        'Ambiguous': ambiguous,
+        'Missing Fraction': ((gaps + missing + ambiguous) / total).round(3) if total else 0.0
+    }, index=labels)
 
-df = loadData()
+# Cache QC reports per dataset; the code matrix itself is not hashed
+@st.cache_data(ttl=3600)
+def getQCReports(datasetHash, _codes, _isIsolateRow, _isolateNames, _positionColumns):
+    """Per-isolate and per-position QC reports for the isolate rows of the code matrix."""
+    isolateCodes = _codes[_isIsolateRow]
+    return getQCReport(isolateCodes, _isolateNames, axis=1), getQCReport(isolateCodes, _positionColumns, axis=0)
 
 # Extract the annotation row for detailed mutation information
 annotationRow = df[df['Unnamed: 0'] == 'annotation']
 
+# Function to identify mutation type
+def get_mutation_type(mutation_name):
+    """Identify the type of mutation based on its name."""
+    mutation_name = mutation_name.lower()
+    if 'non' in mutation_name or 'missense' in mutation_name:
+        return 'nonsynonymous'
+    if 'syn' in mutation_name or 'silent' in mutation_name:
+        return 'synonymous'
+    return 'other'
+
+def parseAnnotation(annotationDetails):
+    """Split an annotation cell into mutation, gene, locus and substitution."""
+    if ',' in annotationDetails:
+        mutation, gene, locus, substitution = annotationDetails.split(',')
+    else:
+        mutation = annotationDetails
+        gene = locus = substitution = "Not annotated"
+    return mutation.strip(), gene.strip(), locus.strip(), substitution.strip()
+
+# Cache annotation parsing so each position is parsed once per dataset
+@st.cache_data(ttl=3600)
+def parseAnnotations(annotationRow, positionColumns):
+    """Parse the annotation row into one row per position, including its mutation type."""
+    if len(annotationRow):
+        parsed = [parseAnnotation(annotationRow[col].values[0]) if col in annotationRow.columns
+                  else ("Not annotated",) * 4 for col in positionColumns]
+    else:
+        parsed = [("Not annotated",) * 4] * len(positionColumns)
+    annotations = pd.DataFrame(parsed, columns=['Mutation', 'Gene', 'Locus', 'Substitution'], index=positionColumns)
+    annotations['Type'] = annotations['Substitution'].map(get_mutation_type)
+    return annotations
+
+@st.cache_data(ttl=3600)
+def getFeatureIndex(annotations, level):
+    """Map each position to an integer index of its gene or locus."""
+    featureCodes, featureNames = pd.factorize(annotations[level])
+    return featureCodes, np.asarray(featureNames)
+
 # Show the full data in an expander section
 with st.expander("Full Data:"):
     st.write(df)
 
 # Extract root sequence
 root = df.iloc[0, 2:]
+
+# Position columns are every column apart from the isolate name and group
+positionColumns = [col for col in root.index if col != 'Group']
+positionCoordinates = np.array([parseCoordinate(col) for col in positionColumns], dtype=float)
+# Positions are coordinate-ordered, so the ones with coordinates form a sorted prefix
+nCoordinatePositions = int(np.count_nonzero(~np.isnan(positionCoordinates)))
 rootSeq = pd.DataFrame(root).T
 st.write("Root Sequence", rootSeq)
 
+rootCodes = codes[0]
+annotations = parseAnnotations(annotationRow, positionColumns)
+isIsolateRow = ~df['Unnamed: 0'].isin(['root', 'MQ', 'annotation']).to_numpy()
+
+# Show missingness per isolate and per position
+with st.expander("Base Call QC Report"):
+    isolateQC, positionQC = getQCReports(datasetHash, codes, isIsolateRow,
+                                         df.loc[isIsolateRow, 'Unnamed: 0'], positionColumns)
+    st.write("Per-isolate QC", isolateQC)
+    # CSVs are built only when a download is clicked
+    st.download_button("Download Per-isolate QC", isolateQC.to_csv, file_name="isolate_qc.csv", mime="text/csv")
+    st.write("Per-position QC", positionQC)
+    st.download_button("Download Per-position QC", positionQC.to_csv, file_name="position_qc.csv", mime="text/csv")
+
 # Extract all isolates options and group options
 isolateOptions = df["Unnamed: 0"].unique()
 isolateOptions = [option for option in isolateOptions if option not in ['root', 'MQ', 'annotation']]
@@ -150,69 +291,230 @@ def getSNPTypeStats(mutationSummaryDf):
         'Percentage': percentages
     }
 
+# Bases used for counting and consensus calling
+BASES = CODE_ALPHABET[:4]
+
+# Consensus code for each combination of tied top bases, indexed by bit mask A=1, C=2, G=4, T=8
+TIED_BASE_CODES = np.array([np.flatnonzero(CODE_ALPHABET == code)[0] for code in
+                            ['N', 'A', 'C', 'M', 'G', 'R', 'S', 'V', 'T', 'W', 'Y', 'H', 'K', 'D', 'B', 'N']])
+
+def getBaseCounts(baseCodes):
+    """Count A/C/G/T calls per position for a (isolates x positions) code matrix."""
+    return np.stack([(baseCodes == code).sum(axis=0) for code in range(len(BASES))])
+
+def getMutantBases(selectedCodes, rootCodes, threshold):
+    """Return base counts, frequencies and a (bases x positions) mask of mutant bases.
+
+    A base is a mutation if it is present, meets the threshold and differs from root.
+    """
+    counts = getBaseCounts(selectedCodes)
+    frequencies = counts / len(selectedCodes)
+    isMutant = (counts > 0) & (frequencies >= threshold) & (np.arange(len(BASES))[:, None] != rootCodes)
+    return counts, frequencies, isMutant
+
+MUTATION_SUMMARY_COLUMNS = ['Location', 'Root Base', 'Mutant Base', 'Frequency', 'Count',
+                            'Other Bases Below Threshold (Frequency and Count)',
+                            'Mutation', 'Gene', 'Locus', 'Substitution']
+
 # Cache mutation summary computation
 @st.cache_data
-def getMutationSummary(filteredDf, root, selectedIsolates, threshold, annotationRow):
+def getMutationSummary(selectedCodes, rootCodes, threshold, annotations, positionColumns):
+    counts, frequencies, isMutant = getMutantBases(selectedCodes, rootCodes, threshold)
+
     mutationSummary = []
-    for col in root.index:
-        rootBase = root[col]
-        
-        selectedBases = filteredDf[col].value_counts()
+    for pos in np.flatnonzero(isMutant.any(axis=0)):
+        col = positionColumns[pos]
         baseSummary = []
         otherBasesSummary = []
-        
-        # Calculate the frequency of each base and compare to the threshold
-        for base, count in selectedBases.items():
-            if base not in ['A', 'C', 'T', 'G']:
+
+        # Most frequent bases first; split into mutations and bases that didn't meet the threshold or did not change from root
+        for code in np.argsort(-counts[:, pos], kind='stable'):
+            if counts[code, pos] == 0:
                 continue
-            frequency = count / len(selectedIsolates)
-            if frequency >= threshold and base != rootBase:  # Append to the summary if base is a mutation from root
-                baseSummary.append((base, frequency, count))
-            else:  # Track bases that didn't meet the threshold or did not change from root
-                otherBasesSummary.append((base, frequency, count))
-        
-        # Extract annotation details if available
-        if col in annotationRow.columns:
-            annotationDetails = annotationRow[col].values[0]
-            if ',' in annotationDetails:
-                mutation, gene, locus, substitution = annotationDetails.split(',')
+            entry = (BASES[code], frequencies[code, pos], counts[code, pos])
+            if isMutant[code, pos]:
+                baseSummary.append(entry)
             else:
-                mutation = annotationDetails
-                gene = locus = substitution = "Not annotated"
-        else:
-            mutation = gene = locus = substitution = "Not annotated"
-        
-        if len(baseSummary) > 0:
-            mutantBase = ", ".join([base for base, _, _ in baseSummary])
-            otherBasesFreq = ", ".join([f"{base}: {freq:.2f} (Count: {count})" for base, freq, count in otherBasesSummary])
-            
-            mutationSummary.append({
-                'Location': col,
-                'Root Base': rootBase,
-                'Mutant Base': mutantBase,
-                'Frequency': ", ".join([f"{freq:.2f}" for _, freq, _ in baseSummary]),
-                'Count': ", ".join([str(count) for _, _, count in baseSummary]),
-                'Other Bases Below Threshold (Frequency and Count)': otherBasesFreq,
-                'Mutation': mutation.strip(),
-                'Gene': gene.strip(),
-                'Locus': locus.strip(),
-                'Substitution': substitution.strip()
-            })
-    return pd.DataFrame(mutationSummary)
+                otherBasesSummary.append(entry)
 
-# Function to identify mutation type
-def get_mutation_type(mutation_name):
-    """Identify the type of mutation based on its name."""
-    mutation_name = mutation_name.lower()
-    if 'non' in mutation_name or 'missense' in mutation_name:
-        return 'nonsynonymous'
-    if 'syn' in mutation_name or 'silent' in mutation_name:
-        return 'synonymous'
-    return 'other'
+        mutation, gene, locus, substitution = annotations.iloc[pos][['Mutation', 'Gene', 'Locus', 'Substitution']]
+        mutantBase = ", ".join([base for base, _, _ in baseSummary])
+        otherBasesFreq = ", ".join([f"{base}: {freq:.2f} (Count: {count})" for base, freq, count in otherBasesSummary])
+
+        mutationSummary.append({
+            'Location': col,
+            'Root Base': CODE_ALPHABET[rootCodes[pos]],
+            'Mutant Base': mutantBase,
+            'Frequency': ", ".join([f"{freq:.2f}" for _, freq, _ in baseSummary]),
+            'Count': ", ".join([str(count) for _, _, count in baseSummary]),
+            'Other Bases Below Threshold (Frequency and Count)': otherBasesFreq,
+            'Mutation': mutation,
+            'Gene': gene,
+            'Locus': locus,
+            'Substitution': substitution
+        })
+    # Keep the columns even when nothing passes the threshold
+    return pd.DataFrame(mutationSummary, columns=MUTATION_SUMMARY_COLUMNS)
+
+# Cache the SNP mask so the burden and density views share one computation per selection and threshold
+@st.cache_data(ttl=3600, max_entries=64)
+def getSNPMask(selectedCodes, rootCodes, threshold):
+    """Positions where at least one base is a mutation for this selection and threshold."""
+    return getMutantBases(selectedCodes, rootCodes, threshold)[2].any(axis=0)
+
+# Cache gene/locus burden computation; the index arrays are fixed per dataset and level, so only those are hashed
+@st.cache_data(ttl=3600, max_entries=64)
+def getFeatureBurden(isSNP, datasetHash, level, _featureCodes, _featureNames, _mutationTypes):
+    """Roll mutated positions up to their gene or locus with grouped counts and dN/dS."""
+    featureCodes, featureNames, mutationTypes = _featureCodes, _featureNames, _mutationTypes
+    nFeatures = len(featureNames)
+    snpCounts = np.bincount(featureCodes[isSNP], minlength=nFeatures)
+    nonsynonymousCounts = np.bincount(featureCodes[isSNP & (mutationTypes == 'nonsynonymous')], minlength=nFeatures)
+    synonymousCounts = np.bincount(featureCodes[isSNP & (mutationTypes == 'synonymous')], minlength=nFeatures)
+    positionCounts = np.bincount(featureCodes, minlength=nFeatures)
+
+    # inf when only non-synonymous SNPs were seen, NaN when neither was
+    ratios = np.where(nonsynonymousCounts > 0, float('inf'), np.nan)
+    hasSynonymous = synonymousCounts > 0
+    ratios[hasSynonymous] = np.round(nonsynonymousCounts[hasSynonymous] / synonymousCounts[hasSynonymous], 2)
+
+    burden = pd.DataFrame({
+        'Positions': positionCounts,
+        'SNPs': snpCounts,
+        'Non-synonymous': nonsynonymousCounts,
+        'Synonymous': synonymousCounts,
+        'Ratio (dN/dS)': ratios
+    }, index=featureNames)
+    return burden[burden['SNPs'] > 0]
+
+# Cache consensus computation
+@st.cache_data
+def getConsensus(groupCodes, threshold):
+    """Call a consensus base code per position, or N when no base reaches the threshold.
+
+    Bases tied for the top count are called with their IUPAC ambiguity code
+    (e.g. a 50/50 A/G split gives R) rather than favouring either base.
+    """
+    counts = getBaseCounts(groupCodes)
+    topCounts = counts.max(axis=0)
+    frequency = topCounts / len(groupCodes)
+    called = (topCounts > 0) & (frequency >= threshold)
+    # Bit mask of the tied top bases (A=1, C=2, G=4, T=8) indexes the matching IUPAC code
+    tiedMask = ((counts == topCounts) << np.arange(len(BASES))[:, None]).sum(axis=0)
+    return np.where(called, TIED_BASE_CODES[tiedMask], N_CODE).astype(np.int8)
+
+# Cache SNP density computation
+@st.cache_data
+def getSNPDensity(isSNP, coordinates, windowStart, windowEnd, windowSize, step):
+    """Count SNPs in sliding windows of windowSize bp from windowStart to windowEnd.
+
+    coordinates must be sorted. A cumulative sum over the SNP flags makes each
+    window count two lookups, so any window size costs a single pass over positions.
+    Windows are clipped at windowEnd, so nothing outside the interval is counted.
+    """
+    cumulativeSNPs = np.concatenate([[0], np.cumsum(isSNP)])
+    starts = np.arange(windowStart, max(windowEnd - windowSize, windowStart) + 1, step)
+    ends = np.minimum(starts + windowSize, windowEnd + 1)
+    left = np.searchsorted(coordinates, starts, side='left')
+    right = np.searchsorted(coordinates, ends, side='left')
+    snpCounts = cumulativeSNPs[right] - cumulativeSNPs[left]
+    return pd.DataFrame({
+        'Window End': ends - 1,
+        'SNPs': snpCounts,
+        'SNPs per kb': snpCounts / np.maximum(ends - starts, 1) * 1000
+    }, index=pd.Index(starts, name='Window Start'))
+
+def getSNPColumns(baseCodes, rootCodes):
+    """Indices of positions where any isolate carries an A/C/G/T base that differs from root."""
+    isAlt = (baseCodes < GAP_CODE) & (baseCodes != rootCodes)
+    return np.flatnonzero(isAlt.any(axis=0))
+
+def getInformativeSites(selectedCodes, groupIdx, groupNames, rootCodes, annotations, positionColumns):
+    """Flag parsimony-informative sites and alt alleles shared by more than one group.
+
+    Per-group base counts for every SNP position are built one group at a
+    time, so temporaries stay the size of one group's rows. A site is
+    parsimony-informative when at least two bases are each seen in two or
+    more isolates, and a possible homoplasy when an allele differing from a
+    called root base occurs in two or more groups.
+    """
+    snpColumns = getSNPColumns(selectedCodes, rootCodes)
+    snpRoot = rootCodes[snpColumns]
+    groupCounts = np.zeros((len(groupNames), len(BASES), len(snpColumns)), dtype=np.int32)
+    for group in range(len(groupNames)):
+        groupSNPCodes = selectedCodes[np.ix_(groupIdx == group, snpColumns)]
+        for code in range(len(BASES)):
+            groupCounts[group, code] = np.count_nonzero(groupSNPCodes == code, axis=0)
+
+    totalCounts = groupCounts.sum(axis=0)
+    isInformative = (totalCounts >= 2).sum(axis=0) >= 2
+    isAltAllele = (np.arange(len(BASES))[:, None] != snpRoot) & (snpRoot < GAP_CODE)
+    isSharedAlt = isAltAllele & ((groupCounts > 0).sum(axis=0) >= 2)
+    isHomoplasy = isSharedAlt.any(axis=0)
+
+    sites = []
+    for site in np.flatnonzero(isInformative | isHomoplasy):
+        sharedAlleles = []
+        for code in np.flatnonzero(isSharedAlt[:, site]):
+            lineages = ", ".join(groupNames[groupCounts[:, code, site] > 0])
+            sharedAlleles.append(f"{BASES[code]} ({lineages})")
+        sites.append({
+            'Location': positionColumns[snpColumns[site]],
+            'Root Base': CODE_ALPHABET[snpRoot[site]],
+            'Base Counts': ", ".join(f"{BASES[code]}: {totalCounts[code, site]}"
+                                     for code in np.flatnonzero(totalCounts[:, site])),
+            'Parsimony Informative': bool(isInformative[site]),
+            'Possible Homoplasy': bool(isHomoplasy[site]),
+            'Shared Alt Alleles (Lineages)': "; ".join(sharedAlleles)
+        })
+    sitesDf = pd.DataFrame(sites, columns=['Location', 'Root Base', 'Base Counts', 'Parsimony Informative',
+                                           'Possible Homoplasy', 'Shared Alt Alleles (Lineages)'])
+    siteAnnotations = annotations[['Mutation', 'Gene', 'Locus', 'Substitution']]
+    return sitesDf.join(siteAnnotations, on='Location')
+
+def iterFasta(names, baseCodes, columnIdx, lineWidth=60):
+    """Yield FASTA lines for each row of baseCodes restricted to columnIdx.
+
+    FASTA stores each sequence as one record, so rows are written one after
+    another, each in lines of lineWidth positions. Only one line of text
+    exists at a time here.
+    """
+    for name, row in zip(names, baseCodes):
+        yield f">{name}\n"
+        for start in range(0, len(columnIdx), lineWidth):
+            yield "".join(CODE_ALPHABET[row[columnIdx[start:start + lineWidth]]]) + "\n"
+
+def writeFasta(lines):
+    """Encode FASTA lines into the bytes served by a download button.
+
+    st.download_button serves its data from memory, so the finished file
+    (about sequences x positions bytes) is held once per click.
+    """
+    buffer = io.BytesIO()
+    for line in lines:
+        buffer.write(line.encode())
+    return buffer.getvalue()
+
+def buildConsensusFasta(baseCodes, groupMasks, nPositions, threshold):
+    """Consensus FASTA with one record per group; only runs when the download is clicked."""
+    names = []
+    sequences = []
+    for group, groupMask in groupMasks.items():
+        groupCodes = baseCodes[groupMask]
+        names.append(f"{group}_consensus (n={len(groupCodes)})")
+        sequences.append(getConsensus(groupCodes, threshold))
+    return writeFasta(iterFasta(names, sequences, np.arange(nPositions)))
+
+def buildAlignmentFasta(names, selectedCodes, rootCodes):
+    """SNP alignment FASTA with root first; only runs when the download is clicked."""
+    snpColumns = getSNPColumns(selectedCodes, rootCodes)
+    return writeFasta(iterFasta(names, itertools.chain([rootCodes], selectedCodes), snpColumns))
 
 # Display results based on selections
 if selected_isolates:
-    filteredDf = df[df["Unnamed: 0"].isin(selected_isolates)]
+    selectedMask = df["Unnamed: 0"].isin(selected_isolates).to_numpy()
+    filteredDf = df[selectedMask]
+    selectedCodes = codes[selectedMask]
 
     # Add a search bar to filter MTBC0 positions
     searchPosition = st.text_input("Search by MTBC0 position:")
@@ -226,9 +528,101 @@ if selected_isolates:
     st.write("Filtered Isolates Data:", filteredDf)
 
     # Get mutation summary
-    mutationSummaryDf = getMutationSummary(filteredDf, root, selected_isolates, threshold, annotationRow)
+    mutationSummaryDf = getPersistentResult(
+        'mutationSummary', datasetHash, selected_isolates, threshold,
+        lambda: getMutationSummary(selectedCodes, rootCodes, threshold, annotations, positionColumns))
     st.write(f"Mutation Summary: ({len(mutationSummaryDf)} rows displayed)", mutationSummaryDf)
+    isSNP = getSNPMask(selectedCodes, rootCodes, threshold)
+
+    # Browse a genomic window and the SNP density of the current selection
+    with st.expander("Genome Window and SNP Density"):
+        if nCoordinatePositions:
+            sortedCoordinates = positionCoordinates[:nCoordinatePositions].astype(np.int64)
+            windowCol1, windowCol2 = st.columns(2)
+            with windowCol1:
+                windowStart = st.number_input("Window start (bp)", min_value=0, value=int(sortedCoordinates[0]), step=1000)
+            with windowCol2:
+                windowEnd = st.number_input("Window end (bp)", min_value=0, value=int(sortedCoordinates[-1]), step=1000)
+
+            # Sorted coordinates turn the interval into a contiguous slice of positions
+            first = np.searchsorted(sortedCoordinates, windowStart, side='left')
+            last = np.searchsorted(sortedCoordinates, windowEnd, side='right')
+            windowColumns = positionColumns[first:last]
+            st.write(f"{len(windowColumns)} positions between {windowStart} and {windowEnd}:",
+                     filteredDf[['Unnamed: 0', 'Group'] + windowColumns])
+            if len(mutationSummaryDf):
+                st.write("Mutations in window:", mutationSummaryDf[mutationSummaryDf['Location'].isin(windowColumns)])
+
+            densityCol1, densityCol2 = st.columns(2)
+            with densityCol1:
+                densityWindow = st.number_input("Density window size (bp)", min_value=1, value=10000, step=1000)
+            with densityCol2:
+                densityStep = st.number_input("Density step (bp)", min_value=1, value=5000, step=1000)
+            densityDf = getSNPDensity(isSNP[:nCoordinatePositions], sortedCoordinates, int(windowStart), int(windowEnd),
+                                      int(densityWindow), int(densityStep))
+            st.line_chart(densityDf['SNPs'])
+            st.write("SNP density per window:", densityDf)
+        else:
+            st.write("No MTBC0 coordinates could be parsed from the position columns.")
     
+    # Roll mutations up to genes or loci for the current selection
+    with st.expander("Gene-level Mutation Burden"):
+        burdenLevel = st.radio("Aggregate by", options=['Gene', 'Locus'], horizontal=True)
+        featureCodes, featureNames = getFeatureIndex(annotations, burdenLevel)
+        burdenDf = getFeatureBurden(isSNP, datasetHash, burdenLevel, featureCodes, featureNames,
+                                    annotations['Type'].to_numpy())
+        # Positions without an annotation share one bucket; report it apart from real genes/loci
+        if "Not annotated" in burdenDf.index:
+            st.write(f"{burdenDf.loc['Not annotated', 'SNPs']} SNPs fall at positions without a {burdenLevel.lower()} annotation.")
+            burdenDf = burdenDf.drop(index="Not annotated")
+        burdenCol1, burdenCol2 = st.columns(2)
+        with burdenCol1:
+            burdenSort = st.selectbox("Sort by", options=list(burdenDf.columns), index=1)
+        with burdenCol2:
+            burdenTopN = st.number_input("Show top N", min_value=1, value=20, step=5)
+        burdenDf = burdenDf.sort_values(burdenSort, ascending=False).head(int(burdenTopN))
+        st.write(f"Most mutated {burdenLevel.lower()}s ({len(burdenDf)} shown):", burdenDf)
+
+    # Export per-group consensus sequences and the SNP alignment for tree building
+    with st.expander("Export Consensus and SNP Alignment"):
+        consensusThreshold = st.slider("Consensus threshold", 0.0, 1.0, 0.5)
+        st.write(f"Consensus bases are called when a base reaches a frequency of {consensusThreshold:.2f}, "
+                 "otherwise N; tied bases get their IUPAC ambiguity code.")
+        groupMasks = {group: selectedMask & (df['Group'] == group).to_numpy()
+                      for group in filteredDf['Group'].unique()}
+        # FASTA is generated by a callable, so nothing is built unless the button is clicked
+        st.download_button(
+            "Download Consensus FASTA",
+            data=functools.partial(buildConsensusFasta, codes, groupMasks, len(positionColumns), consensusThreshold),
+            file_name="consensus.fasta",
+            mime="text/plain"
+        )
+
+        # Root is the first sequence so reference bases are kept in the alignment
+        snpColumns = getSNPColumns(selectedCodes, rootCodes)
+        st.write(f"SNP alignment: {len(filteredDf) + 1} sequences x {len(snpColumns)} SNP positions")
+        alignmentNames = ['root'] + filteredDf["Unnamed: 0"].tolist()
+        st.download_button(
+            "Download SNP Alignment FASTA",
+            data=functools.partial(buildAlignmentFasta, alignmentNames, selectedCodes, rootCodes),
+            file_name="snp_alignment.fasta",
+            mime="text/plain"
+        )
+
+    # Screen the selection for parsimony-informative sites and alleles shared across lineages
+    with st.expander("Parsimony-informative Sites and Homoplasy Screen"):
+        groupIdx, groupNames = pd.factorize(filteredDf['Group'].astype(str))
+        sitesDf = getPersistentResult(
+            'informativeSites', datasetHash, selected_isolates, 0.0,
+            lambda: getInformativeSites(selectedCodes, groupIdx, np.asarray(groupNames), rootCodes,
+                                        annotations, positionColumns))
+        st.write(f"{int(sitesDf['Parsimony Informative'].sum())} parsimony-informative sites, "
+                 f"{int(sitesDf['Possible Homoplasy'].sum())} possible homoplasies across {len(groupNames)} lineage(s)")
+        if st.checkbox("Show possible homoplasies only"):
+            sitesDf = sitesDf[sitesDf['Possible Homoplasy']]
+        st.write(sitesDf)
+        st.download_button("Download Site Screen", sitesDf.to_csv(index=False), file_name="informative_sites.csv", mime="text/csv")
+
     # Add SNP distribution statistics in an expander
     with st.expander("View SNP Type Distribution Across Groups"):
         st.subheader("Distribution of SNP Types in M. caprae Lineages")
@@ -239,14 +633,13 @@ if selected_isolates:
         
         # First pass: collect all unique substitution types across all groups
         for group in unique_groups:
-            group_isolates = df[df['Group'] == group]["Unnamed: 0"].unique()
-            group_isolates = [x for x in group_isolates if x not in ['root', 'MQ', 'annotation']]
+            group_codes = codes[isIsolateRow & (df['Group'] == group).to_numpy()]
             
-            if group_isolates:
-                group_df = df[df["Unnamed: 0"].isin(group_isolates)]
+            if len(group_codes):
                 # Now using threshold instead of 0.0
-                group_mutations = getMutationSummary(group_df, root, group_isolates, threshold, annotationRow)
-                stats = getSNPTypeStats(group_mutations)
+                stats = getPersistentResult(
+                    'groupStats', datasetHash, [group], threshold,
+                    lambda: getSNPTypeStats(getMutationSummary(group_codes, rootCodes, threshold, annotations, positionColumns)))
                 group_stats[group] = stats
                 all_substitution_types.update(stats['Count'].index)
         
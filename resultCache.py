@@ -0,0 +1,148 @@
+"""Persistent on-disk cache for expensive results.
+
+Entries survive server restarts and are shared by every process pointed at the
+same cache directory. Each entry is a zlib-compressed pickle named by a key
+built from the dataset content hash, a fingerprint of the selection, the
+threshold and the code version. Total size is bounded by evicting the least
+recently used entries; writes go through a temporary file and an atomic
+rename, so concurrent writers never expose a partial entry.
+
+The cache is best-effort: unreadable entries are misses and failed writes are
+logged, never raised. Entries are unpickled on read, so the cache directory
+must only be writable by trusted users. It defaults to a per-user directory
+under $XDG_CACHE_HOME (or ~/.cache) and can be moved with CAPRAE_CACHE_DIR.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get(
+    "CAPRAE_CACHE_DIR",
+    os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "caprae"))
+MAX_CACHE_BYTES = int(os.environ.get("CAPRAE_CACHE_MAX_BYTES", 512 * 2**20))
+# Bump when the on-disk entry format changes
+FORMAT_VERSION = 1
+ENTRY_SUFFIX = ".pkl.z"
+TMP_SUFFIX = ".tmp"
+# Temporary files older than this belong to writers that died before renaming them
+STALE_TMP_SECONDS = 3600
+
+
+def fileDigest(path):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(selection):
+    """Order-independent hash of the selected isolate or group names."""
+    return hashlib.sha256("\0".join(sorted(map(str, selection))).encode()).hexdigest()
+
+
+def makeKey(kind, datasetHash, selection, threshold, codeVersion):
+    parts = [kind, str(FORMAT_VERSION), codeVersion, datasetHash, fingerprint(selection), repr(float(threshold))]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def entryPath(key):
+    return os.path.join(CACHE_DIR, key + ENTRY_SUFFIX)
+
+
+def load(key):
+    """Return the cached value for key, or None on a miss or unreadable entry."""
+    path = entryPath(key)
+    try:
+        with open(path, "rb") as handle:
+            value = pickle.loads(zlib.decompress(handle.read()))
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Any unreadable entry (corrupt, truncated, stale classes) is treated as a miss and dropped
+        logger.warning("Dropping unreadable cache entry %s", path, exc_info=True)
+        removeEntry(path)
+        return None
+    # Touch the entry so eviction sees it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+
+def store(key, value):
+    """Write value under key atomically, then evict old entries past the size bound."""
+    # Private to this user, since entries are unpickled on read
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    payload = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    fd, tmpPath = tempfile.mkstemp(dir=CACHE_DIR, suffix=TMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(payload)
+        os.replace(tmpPath, entryPath(key))
+    except OSError:
+        removeEntry(tmpPath)
+        raise
+    evict(MAX_CACHE_BYTES)
+
+
+def removeEntry(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(maxBytes):
+    """Delete least recently used entries until the cache fits in maxBytes.
+
+    Stale temporary files left by dead writers are swept first; temporary
+    files still being written count towards the size bound.
+    """
+    entries = []
+    pendingBytes = 0
+    staleBefore = time.time() - STALE_TMP_SECONDS
+    with os.scandir(CACHE_DIR) as scan:
+        for entry in scan:
+            isTmp = entry.name.endswith(TMP_SUFFIX)
+            if not isTmp and not entry.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted or renamed by another process
+                continue
+            if not isTmp:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif stat.st_mtime < staleBefore:
+                removeEntry(entry.path)
+            else:
+                pendingBytes += stat.st_size
+
+    total = pendingBytes + sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= maxBytes:
+            break
+        removeEntry(path)
+        total -= size
+
+
+def getOrCompute(kind, datasetHash, selection, threshold, codeVersion, compute):
+    """Return the cached result for these inputs, calling compute() and storing it on a miss."""
+    key = makeKey(kind, datasetHash, selection, threshold, codeVersion)
+    value = load(key)
+    if value is None:
+        value = compute()
+        try:
+            store(key, value)
+        except Exception:
+            # A read-only or full cache directory must not break the app
+            logger.warning("Could not write %s to the result cache in %s", kind, CACHE_DIR, exc_info=True)
+    return value